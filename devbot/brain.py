@@ -1,73 +1,252 @@
 import datetime
+import functools
+import re
 import time
-from typing import Optional, Set
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 import anthropic
+import httpx
 
 from devbot.config import config
 from devbot.git_ops import GitOps
 from devbot.interfaces import IFileSystem, IGitOps
+from devbot.llm_cache import LLMCache
 from devbot.tools import FileSystemTools
 
+# Maximum silence on the stream socket before httpx aborts the read (SSE pings count
+# as traffic, so a slow but live generation is not cut off).
+STREAM_CHUNK_TIMEOUT = 30.0
+# Only the read timeout is tightened; connect/write/pool keep the SDK defaults.
+STREAM_TIMEOUT = httpx.Timeout(600.0, connect=5.0, read=STREAM_CHUNK_TIMEOUT)
+# Commands that never carry a content block, so the first line is the whole call.
+SINGLE_LINE_COMMANDS = ("READ_FILE", "LIST_FILES")
+COMMAND_NAMES = SINGLE_LINE_COMMANDS + ("WRITE_FILE", "DONE")
+# Upper bound on lookups from one reply that run at the same time.
+LOOKUP_WORKERS = 8
+
+# The single definition of a command line, shared by the parser and the stream check:
+# a known command name as a whole word at the start of the line.
+_COMMAND = r"(" + "|".join(COMMAND_NAMES) + r")\b"
+_ARGUMENT = r"[ \t]*([^\n]*?)[ \t]*(?:\n|\Z)"
+# A >>>> only closes the block at the end of a line, so content may contain ">>>>".
+_BLOCK = r"(?:\s*<<<<\n?(.*?)>>>>(?=[ \t]*(?:\n|\Z)))?"
+COMMAND_LINE_RE = re.compile(r"[ \t]*" + _COMMAND)
+
+# One command line plus its optional <<<< >>>> block, matched in a single pass.
+# Groups: (command, argument, block).
+CMD_RE = re.compile(r"\s*" + _COMMAND + _ARGUMENT + _BLOCK, re.S)
+
+# A DONE line anywhere in a reply, for when the model announces completion in prose
+# before the command. Only whole lines starting with DONE count.
+DONE_RE = re.compile(r"^[ \t]*DONE\b" + _ARGUMENT + _BLOCK, re.M | re.S)
+
+# (command, argument, block) parsed from a reply.
+Command = Tuple[str, str, Optional[str]]
+
+
+def command_name(line: str) -> Optional[str]:
+    """Return the command a line starts with, or None if it is not a command line."""
+    match = COMMAND_LINE_RE.match(line)
+    return match.group(1) if match else None
+
+
+# Number of most recent tool exchanges kept verbatim in the conversation.
+HISTORY_KEEP_TURNS = 5
+# Consecutive replies without a tool command after which the loop gives up.
+MAX_IDLE_TURNS = 2
+
+SYSTEM_PROMPT = (
+    "You are an autonomous senior DevOps engineer.\n"
+    "Your goal is to implement the user's plan by reading code, modifying files,"
+    " and ensuring the project runs.\n\n"
+    "You have the following tools available via specific output formats:\n"
+    "1. READ_FILE <path>\n"
+    "2. WRITE_FILE <path>\n<<<<\ncontent\n>>>>\n"
+    "3. LIST_FILES <path>\n"
+    "4. DONE <pr_title>\n<<<<\npr_description\n>>>>\n\n"
+    "When you want to use a tool, output the command as the FIRST line of your response.\n"
+    "You may batch several commands, one after another, at the start of a response;"
+    " put every READ_FILE and LIST_FILES you need on consecutive lines.\n"
+    "If writing a file or description, use the <<<< delimiter."
+)
+
+
+@functools.lru_cache(maxsize=1)
+def _http_client() -> httpx.Client:
+    """One pooled HTTP/2 client shared by every Agent, so loop iterations reuse the connection."""
+    return anthropic.DefaultHttpxClient(
+        http2=True, limits=httpx.Limits(max_keepalive_connections=4)
+    )
+
 
 class Agent:
     def __init__(self, fs: Optional[IFileSystem] = None, git: Optional[IGitOps] = None) -> None:
-        self.client = anthropic.Anthropic(api_key=config.ANTHROPIC_API_KEY)
+        self.client = anthropic.Anthropic(
+            api_key=config.ANTHROPIC_API_KEY, http_client=_http_client()
+        )
         self.tools = fs if fs else FileSystemTools()
         self.git = git if git else GitOps()
         self.model = "claude-3-5-sonnet-20240620"
-        self.files_created: Set[str] = set()
-        self.files_modified: Set[str] = set()
+        self._plan_text = ""
+        self.cache: Optional[LLMCache] = (
+            LLMCache(config.LLM_CACHE_DIR, config.LLM_CACHE_TTL)
+            if config.LLM_CACHE_ENABLED
+            else None
+        )
+        self.handlers: Dict[str, Callable[[str, Optional[str]], str]] = {
+            "READ_FILE": self._do_read,
+            "LIST_FILES": self._do_list,
+            "WRITE_FILE": self._do_write,
+        }
 
     def run_task(self, plan_path: str, task_name: str) -> None:
         print(f"Starting task: {task_name}")
-        self.files_created.clear()
-        self.files_modified.clear()
-        plan_content = self.tools.read_file(plan_path)
+        if self.cache:
+            self.cache.reset_stats()
+        self._plan_text = self.tools.read_file(plan_path)
         branch_name = f"devbot/{task_name}-{int(time.time())}"
         self.git.create_branch(branch_name)
 
-        system_prompt = (
-            "You are an autonomous senior DevOps engineer.\n"
-            "Your goal is to implement the user's plan by reading code, modifying files,"
-            " and ensuring the project runs.\n\n"
-            "You have the following tools available via specific output formats:\n"
-            "1. READ_FILE <path>\n"
-            "2. WRITE_FILE <path>\n<<<<\ncontent\n>>>>\n"
-            "3. LIST_FILES <path>\n"
-            "4. DONE <pr_title>\n<<<<\npr_description\n>>>>\n\n"
-            "When you want to use a tool, output the command as the FIRST line of your response.\n"
-            "If writing a file or description, use the <<<< delimiter."
-        )
-
         messages = [
             {
                 "role": "user",
-                "content": f"Here is the plan:\n{plan_content}\n\nList the files to understand the repo structure first.",
+                "content": [
+                    {
+                        "type": "text",
+                        "text": f"Here is the plan:\n{self._plan_text}\n\nList the files to understand the repo structure first.",
+                        # Cache the plan as part of the prefix reused by every iteration.
+                        "cache_control": {"type": "ephemeral"},
+                    }
+                ],
             }
         ]
 
+        done = self._run_loop(messages)
+        if done is None:
+            self._shelve_unfinished(branch_name)
+            return
+        self._handle_done(done, branch_name)
+        self._generate_report(plan_path, task_name)
+
+    def _run_loop(self, messages: List[Dict[str, Any]]) -> Optional[Command]:
+        """Drive the tool loop until the model answers DONE; return that command."""
+        done = None
+        last_reply_hash = None
+        idle_turns = 0
         for _ in range(15):
-            response = self.client.messages.create(
-                model=self.model,
-                max_tokens=4096,
-                system=system_prompt,
-                messages=messages,
-            )
-            reply = response.content[0].text
+            reply = self._complete(SYSTEM_PROMPT, messages)
             print(f"\n[AI]: {reply[:100]}...")
+
+            # A model repeating itself will keep doing so; stop before burning the budget.
+            reply_hash = hash(reply)
+            if reply_hash == last_reply_hash:
+                print("Stopping: model repeated its previous reply")
+                break
+            last_reply_hash = reply_hash
             messages.append({"role": "assistant", "content": reply})
 
-            if "DONE" in reply:
-                self._handle_done(reply, branch_name, plan_content)
-                self._generate_report(plan_path, task_name)
+            commands = self._parse_commands(reply)
+            if commands and commands[-1][0] == "DONE":
+                done = commands.pop()
+                # Tool calls batched before DONE still have to land before committing.
+                if commands:
+                    self._execute_tool(commands)
+                break
+
+            tool_output = self._execute_tool(commands)
+            idle_turns = idle_turns + 1 if not commands else 0
+            if idle_turns >= MAX_IDLE_TURNS:
+                print("Stopping: no tool command in consecutive replies")
                 break
 
-            tool_output = self._execute_tool(reply)
             messages.append({"role": "user", "content": f"Tool Output:\n{tool_output}"})
+            self._compact_history(messages)
+
+        if self.cache:
+            print(self.cache.stats())
+        return done
+
+    def _compact_history(self, messages: List[Dict[str, Any]]) -> None:
+        """Shrink tool exchanges older than HISTORY_KEEP_TURNS to one-line summaries.
+
+        messages[0] is the task prompt and is never touched, so it stays a stable
+        prefix; every later assistant/user pair is one tool exchange.
+        """
+        cutoff = len(messages) - 2 * HISTORY_KEEP_TURNS
+        for i in range(1, cutoff, 2):
+            reply = messages[i]["content"]
+            # Keep every command of a batched reply, minus its blocks, so the model
+            # still knows each file it wrote.
+            calls = [f"{name} {arg}".strip() for name, arg, _ in self._parse_commands(reply)]
+            if not calls:
+                calls = [reply.strip().partition("\n")[0]]
+            messages[i]["content"] = "\n".join(calls)
+            messages[i + 1]["content"] = f"[summarized: ran {', '.join(calls)}, output omitted]"
+
+    def _complete(self, system_prompt: str, messages: List[Dict[str, Any]]) -> str:
+        """Return the model reply, served from the local cache when possible."""
+        if not self.cache:
+            return self._stream_reply(system_prompt, messages)
+
+        key = LLMCache.make_key(self.model, system_prompt, messages)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        reply = self._stream_reply(system_prompt, messages)
+        self.cache.set(key, reply)
+        return reply
+
+    def _stream_reply(self, system_prompt: str, messages: List[Dict[str, Any]]) -> str:
+        """Stream a reply, stopping early once a run of lookup commands is complete."""
+        chunks: List[str] = []
+        pending_line = ""
+        checking = True
+        saw_lookup = False
+        finished = False
+        with self.client.messages.stream(
+            model=self.model,
+            max_tokens=4096,
+            # The system prompt never changes, so it is served from the prompt cache.
+            system=[
+                {"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}
+            ],
+            messages=messages,
+            timeout=STREAM_TIMEOUT,
+        ) as stream:
+            for text in stream.text_stream:
+                chunks.append(text)
+                if not checking:
+                    continue
+
+                # Lookups carry no block, so once a run of them is followed by a line
+                # that is not another command, the rest of the reply is never used.
+                *lines, pending_line = (pending_line + text).split("\n")
+                for line in filter(None, (raw.strip() for raw in lines)):
+                    name = command_name(line)
+                    if name in SINGLE_LINE_COMMANDS:
+                        saw_lookup = True
+                        continue
+                    checking = False
+                    finished = saw_lookup and name is None
+                    break
+                # Don't wait for the newline of a trailing line that already cannot be
+                # a command (e.g. one long paragraph after the lookups).
+                partial = pending_line.lstrip()
+                if checking and saw_lookup and partial:
+                    finished = command_name(partial) is None and not any(
+                        name.startswith(partial) for name in COMMAND_NAMES
+                    )
+                if finished:
+                    break
+        return "".join(chunks)
 
     def iterate_on_feedback(self, branch_name: str, feedback: str) -> None:
         print(f"Iterating on {branch_name} with feedback")
+        if self.cache:
+            self.cache.reset_stats()
         self.git.checkout_branch(branch_name)
         messages = [
             {
@@ -78,48 +257,80 @@ class Agent:
                 ),
             }
         ]
-        # Placeholder for future loop reuse.
-        pass
 
-    def _execute_tool(self, reply: str) -> str:
-        lines = reply.split("\n")
-        command_line = lines[0].strip()
+        done = self._run_loop(messages)
+        if done is None:
+            self._shelve_unfinished(branch_name)
+            return
+        self.git.commit_changes(f"Addressed feedback: {done[1]}")
+        self.git.push_changes(branch_name)
 
-        if command_line.startswith("READ_FILE"):
-            path = command_line.split(" ", 1)[1]
-            return self.tools.read_file(path)
+    def _shelve_unfinished(self, branch_name: str) -> None:
+        """Stash the writes of a loop that stopped without DONE.
 
-        if command_line.startswith("LIST_FILES"):
-            path = command_line.split(" ", 1)[1] if " " in command_line else "."
-            return self.tools.list_files(path)
+        Otherwise the next task would start from a dirty tree and commit these
+        files into an unrelated PR; the stash keeps them recoverable.
+        """
+        print(f"Task on {branch_name} ended without DONE; nothing committed or pushed")
+        self.git.stash_changes(f"devbot: unfinished work on {branch_name}")
 
-        if command_line.startswith("WRITE_FILE"):
-            path = command_line.split(" ", 1)[1]
-            try:
-                content = reply.split("<<<<")[1].split(">>>>")[0].strip()
-                if content.startswith("\n"):
-                    content = content[1:]
+    def _execute_tool(self, commands: List[Command]) -> str:
+        if not commands:
+            return "No tool command found."
 
-                if "Error reading file" in self.tools.read_file(path):
-                    self.files_created.add(path)
-                else:
-                    self.files_modified.add(path)
+        # Consecutive lookups run concurrently; writes run one at a time, in order.
+        outputs: List[str] = []
+        for is_lookup, group in groupby(commands, key=lambda c: c[0] in SINGLE_LINE_COMMANDS):
+            batch = list(group)
+            if is_lookup and len(batch) > 1:
+                with ThreadPoolExecutor(max_workers=LOOKUP_WORKERS) as pool:
+                    outputs.extend(pool.map(self._run_command, batch))
+            else:
+                outputs.extend(self._run_command(command) for command in batch)
 
-                return self.tools.write_file(path, content)
-            except IndexError:
-                return "Error: Invalid WRITE_FILE format. Use <<<< and >>>>"
+        if len(commands) == 1:
+            return outputs[0]
+        return "\n\n".join(
+            f"==> {f'{command} {arg}'.strip()} <==\n{output}"
+            for (command, arg, _), output in zip(commands, outputs)
+        )
 
-        return "No tool command found."
+    def _parse_commands(self, reply: str) -> List[Command]:
+        """Collect the commands at the start of a reply, plus a DONE found anywhere after them."""
+        commands: List[Command] = []
+        pos = 0
+        while match := CMD_RE.match(reply, pos):
+            command, arg, block = match.groups()
+            commands.append((command, arg, block.strip() if block is not None else None))
+            if command == "DONE":
+                return commands
+            pos = match.end()
 
-    def _handle_done(self, reply: str, branch_name: str, plan_content: str) -> None:
-        try:
-            lines = reply.split("\n")
-            cmd_line = lines[0]
-            title = cmd_line.replace("DONE", "").strip()
+        # Searching only past the leading commands keeps WRITE_FILE contents out of it.
+        if done := DONE_RE.search(reply, pos):
+            title, block = done.groups()
+            commands.append(("DONE", title, block.strip() if block is not None else None))
+        return commands
+
+    def _run_command(self, command: Command) -> str:
+        name, arg, block = command
+        return self.handlers[name](arg, block)
+
+    def _do_read(self, path: str, _block: Optional[str]) -> str:
+        return self.tools.read_file(path)
 
-            body = plan_content
-            if "<<<<" in reply:
-                body = reply.split("<<<<")[1].split(">>>>")[0].strip()
+    def _do_list(self, path: str, _block: Optional[str]) -> str:
+        return self.tools.list_files(path or ".")
+
+    def _do_write(self, path: str, content: Optional[str]) -> str:
+        if content is None:
+            return "Error: Invalid WRITE_FILE format. Use <<<< and >>>>"
+        return self.tools.write_file(path, content)
+
+    def _handle_done(self, done: Command, branch_name: str) -> None:
+        try:
+            _, title, block = done
+            body = block if block is not None else self._plan_text
 
             self.git.commit_changes(f"Implemented: {title}")
             self.git.push_changes(branch_name)
@@ -132,8 +343,10 @@ class Agent:
         yy_mm_dd = datetime.datetime.now().strftime("%y%m%d")
         report_filename = f"ai-plans/{yy_mm_dd}__IMPLEMENTATION_REPORT__{task_name}.md"
 
-        created_list = "\n".join([f"- {f}" for f in sorted(self.files_created)]) or "None"
-        modified_list = "\n".join([f"- {f}" for f in sorted(self.files_modified)]) or "None"
+        changes = self.git.changed_files("main")
+        created_list = "\n".join([f"- {f}" for f in sorted(changes["created"])]) or "None"
+        modified_list = "\n".join([f"- {f}" for f in sorted(changes["modified"])]) or "None"
+        deleted_list = "\n".join([f"- {f}" for f in sorted(changes["deleted"])]) or "None"
 
         content = f"""---
 filename: "{report_filename}"
@@ -143,9 +356,9 @@ updatedAt: {timestamp}
 plan_file: "{plan_path}"
 project: "{config.REPO_NAME}"
 status: completed
-files_created: {len(self.files_created)}
-files_modified: {len(self.files_modified)}
-files_deleted: 0
+files_created: {len(changes["created"])}
+files_modified: {len(changes["modified"])}
+files_deleted: {len(changes["deleted"])}
 tags: [report, automated]
 documentType: IMPLEMENTATION_REPORT
 ---
@@ -160,6 +373,9 @@ The AI Agent successfully executed the plan `{plan_path}`. All steps marked in t
 ## Modified
 {modified_list}
 
+## Deleted
+{deleted_list}
+
 # Key Changes
 - Automated implementation of logic defined in the plan.
 - Integration with Git for version control.
@@ -10,6 +10,15 @@ class Config:
     REPO_NAME = os.getenv("REPO_NAME")  # format: "owner/repo"
     AI_DOCS_DIR = "ai-docs"
 
+    # Commit identity used when git has no user.name/user.email configured
+    GIT_AUTHOR_NAME = os.getenv("GIT_AUTHOR_NAME", "DevBot")
+    GIT_AUTHOR_EMAIL = os.getenv("GIT_AUTHOR_EMAIL", "devbot@localhost")
+
+    # Reply cache (kept outside the working tree so it never ends up in a commit)
+    LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+    LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR", os.path.expanduser("~/.cache/devbot/llm"))
+    LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", "86400"))
+
     # Validation
     if not ANTHROPIC_API_KEY:
         raise ValueError("ANTHROPIC_API_KEY is missing")
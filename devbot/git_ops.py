@@ -1,5 +1,11 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List
+
+import pygit2
 from git import Repo  # type: ignore
 from github import Github  # type: ignore
+from github.Repository import Repository
+from pygit2.enums import FileStatus
 
 from devbot.config import config
 from devbot.interfaces import IGitOps
@@ -7,33 +13,91 @@ from devbot.interfaces import IGitOps
 
 class GitOps(IGitOps):
     def __init__(self) -> None:
-        self.repo = Repo(".")
-        self.gh = Github(config.GITHUB_TOKEN)
-        self.gh_repo = self.gh.get_repo(config.REPO_NAME)
+        # Resolve the GitHub repo (a network round-trip) in the background; it is
+        # only needed once a PR is opened.
+        executor = ThreadPoolExecutor(max_workers=1)
+        self._gh_repo_future: Future[Repository] = executor.submit(self._connect_github)
+        executor.shutdown(wait=False)
+        # Local operations go through libgit2 in-process; the git CLI (via GitPython)
+        # is kept only for pull/checkout of remote branches/push, which need the
+        # user's configured remotes and credential helpers.
+        self.repo = pygit2.Repository(".")
+        self.git_cli = Repo(".").git
+
+    @staticmethod
+    def _connect_github() -> Repository:
+        return Github(config.GITHUB_TOKEN).get_repo(config.REPO_NAME)
+
+    @property
+    def gh_repo(self) -> Repository:
+        return self._gh_repo_future.result()
 
     def create_branch(self, branch_name: str) -> None:
-        if self.repo.active_branch.name != "main":
-            self.repo.git.checkout("main")
-        self.repo.git.pull()
-        branch = self.repo.create_head(branch_name)
-        branch.checkout()
+        if self.repo.head.shorthand != "main":
+            self.repo.checkout(self.repo.branches.local["main"])
+        self.git_cli.pull()
+        # Surface a bad token or REPO_NAME now, before any work is done on the branch.
+        self._gh_repo_future.result()
+        branch = self.repo.branches.local.create(branch_name, self.repo.head.peel(pygit2.Commit))
+        self.repo.checkout(branch)
         print(f"Switched to new branch: {branch_name}")
 
     def checkout_branch(self, branch_name: str) -> None:
-        self.repo.git.checkout(branch_name)
-        self.repo.git.pull()
+        self.git_cli.checkout(branch_name)
+        self.git_cli.pull()
         print(f"Checked out {branch_name}")
 
     def commit_changes(self, message: str) -> None:
-        self.repo.git.add(A=True)
-        self.repo.index.commit(message)
+        index = self.repo.index
+        index.read()
+        index.add_all()
+        # add_all does not stage deletions, which `git add -A` did.
+        for path, flags in self.repo.status().items():
+            if flags & FileStatus.WT_DELETED:
+                index.remove(path)
+        index.write()
+
+        signature = self._signature()
+        parents = [] if self.repo.head_is_unborn else [self.repo.head.target]
+        self.repo.create_commit("HEAD", signature, signature, message, index.write_tree(), parents)
         print(f"Committed changes: {message}")
 
+    def stash_changes(self, message: str) -> None:
+        if not self.repo.status():
+            return
+        self.repo.stash(self._signature(), message, include_untracked=True)
+        print(f"Stashed uncommitted changes: {message}")
+
+    def _signature(self) -> pygit2.Signature:
+        try:
+            return self.repo.default_signature
+        except KeyError:
+            # pygit2's NotFoundError: no user.name/user.email, e.g. on a fresh bot host.
+            return pygit2.Signature(config.GIT_AUTHOR_NAME, config.GIT_AUTHOR_EMAIL)
+
     def push_changes(self, branch_name: str) -> None:
-        origin = self.repo.remote(name="origin")
-        origin.push(branch_name, set_upstream=True)
+        self.git_cli.push("--set-upstream", "origin", branch_name)
         print(f"Pushed {branch_name}")
 
+    def changed_files(self, base: str = "main") -> Dict[str, List[str]]:
+        changes: Dict[str, List[str]] = {"created": [], "modified": [], "deleted": []}
+        head = self.repo.head.target
+        base_tip = self.repo.branches.local[base].target
+        # Unrelated histories have no merge base; compare against the base tip instead.
+        merge_base = self.repo.merge_base(base_tip, head) or base_tip
+        diff = self.repo.diff(merge_base, head)
+        diff.find_similar()
+        for delta in diff.deltas:
+            status = delta.status_char()
+            if status in ("A", "C"):
+                changes["created"].append(delta.new_file.path)
+            elif status == "D":
+                changes["deleted"].append(delta.old_file.path)
+            else:
+                # M, T and renames (R): report the path as it is now.
+                changes["modified"].append(delta.new_file.path)
+        return changes
+
     def create_pr(self, branch_name: str, title: str, body: str) -> str:
         pr = self.gh_repo.create_pull(
             title=title,
@@ -1,4 +1,5 @@
 from abc import ABC, abstractmethod
+from typing import Dict, List
 
 
 class IFileSystem(ABC):
@@ -34,6 +35,11 @@ class IGitOps(ABC):
         """Commit staged changes with a message."""
         raise NotImplementedError
 
+    @abstractmethod
+    def stash_changes(self, message: str) -> None:
+        """Stash uncommitted (including untracked) changes so the tree is clean."""
+        raise NotImplementedError
+
     @abstractmethod
     def push_changes(self, branch_name: str) -> None:
         """Push the current branch to the remote."""
@@ -43,3 +49,8 @@ class IGitOps(ABC):
     def create_pr(self, branch_name: str, title: str, body: str) -> str:
         """Create a pull request and return its URL."""
         raise NotImplementedError
+
+    @abstractmethod
+    def changed_files(self, base: str = "main") -> Dict[str, List[str]]:
+        """Return the created, modified and deleted paths of HEAD relative to base."""
+        raise NotImplementedError
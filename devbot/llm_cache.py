@@ -0,0 +1,53 @@
+import hashlib
+import json
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+
+class LLMCache:
+    """Exact-match reply cache stored as one JSON file per request hash."""
+
+    def __init__(self, directory: str, ttl: int) -> None:
+        self.directory = Path(directory)
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(model: str, system: Any, messages: Any) -> str:
+        payload = json.dumps(
+            {"model": model, "system": system, "messages": messages}, sort_keys=True
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            with open(self.directory / f"{key}.json", "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+
+        if entry.get("expires_at", 0) < time.time():
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return str(entry["reply"])
+
+    def set(self, key: str, reply: str) -> None:
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            entry = {"reply": reply, "expires_at": time.time() + self.ttl}
+            with open(self.directory / f"{key}.json", "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+        except OSError as e:  # pragma: no cover - cache is best-effort
+            print(f"Error writing LLM cache entry: {e}")
+
+    def reset_stats(self) -> None:
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> str:
+        return f"LLM cache: {self.hits} hits, {self.misses} misses"
@@ -1,21 +1,43 @@
-from fastapi import FastAPI, Request
+import functools
+import threading
+
+import orjson
+from fastapi import BackgroundTasks, FastAPI, Request
 
 from devbot.brain import Agent
 
 app = FastAPI()
-devbot = Agent()
+# Feedback runs check out branches in one working tree, so they must not overlap.
+_feedback_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=1)
+def get_agent() -> Agent:
+    """Build the agent on first use so server start-up makes no API calls."""
+    return Agent()
+
+
+def handle_feedback(branch: str, feedback: str) -> None:
+    """Apply review feedback; runs in Starlette's threadpool, off the event loop."""
+    with _feedback_lock:
+        get_agent().iterate_on_feedback(branch, feedback)
 
 
 @app.post("/webhook")
-async def github_webhook(request: Request) -> dict[str, str]:
-    data = await request.json()
+async def github_webhook(request: Request, background_tasks: BackgroundTasks) -> dict[str, str]:
+    # Only review deliveries can carry feedback; skip everything else unparsed.
+    if request.headers.get("X-GitHub-Event") != "pull_request_review":
+        return {"status": "ignored"}
+
+    data = orjson.loads(await request.body())
 
     if "review" in data and data.get("action") == "submitted":
         state = data["review"].get("state")
         if state == "changes_requested":
             branch = data["pull_request"]["head"]["ref"]
-            feedback = data["review"].get("body", "")
+            # GitHub sends "body": null for a review submitted without a comment.
+            feedback = data["review"].get("body") or ""
             print(f"Feedback received on {branch}")
-            devbot.iterate_on_feedback(branch, feedback)
+            background_tasks.add_task(handle_feedback, branch, feedback)
 
     return {"status": "ok"}
@@ -1,8 +1,11 @@
 import os
 from pathlib import Path
+from typing import Iterator
 
 from devbot.interfaces import IFileSystem
 
+SKIP_DIRS = frozenset({".git", "__pycache__", ".venv", ".pytest_cache", "node_modules"})
+
 
 class FileSystemTools(IFileSystem):
     def read_file(self, file_path: str) -> str:
@@ -24,12 +27,19 @@ class FileSystemTools(IFileSystem):
 
     def list_files(self, directory: str = ".") -> str:
         try:
-            files = []
-            for root, _, filenames in os.walk(directory):
-                if any(skip in root for skip in (".git", "__pycache__", ".venv")):
-                    continue
-                for filename in filenames:
-                    files.append(os.path.join(root, filename))
-            return "\n".join(files)
+            return "\n".join(self._walk(directory))
         except Exception as e:  # pragma: no cover
             return f"Error listing files: {e}"
+
+    def _walk(self, directory: str) -> Iterator[str]:
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if entry.name not in SKIP_DIRS:
+                            yield from self._walk(entry.path)
+                    else:
+                        yield entry.path
+        except OSError:
+            # Unreadable directories are skipped, matching os.walk.
+            return
@@ -1,5 +1,8 @@
 import os
+import queue
+import threading
 import time
+from typing import Dict, Tuple
 
 from watchdog.events import FileSystemEventHandler
 from watchdog.observers import Observer
@@ -7,27 +10,67 @@ from watchdog.observers import Observer
 from devbot.brain import Agent
 from devbot.config import config
 
+# How long a new plan must go without writes before it is run, so a file that is
+# still being written is never read half-finished.
+SETTLE_SECONDS = 1.0
+
 
 class PlanHandler(FileSystemEventHandler):
-    def __init__(self) -> None:
-        self.devbot = Agent()
+    def __init__(self, plans: "queue.Queue[Tuple[str, str]]") -> None:
+        self.plans = plans
 
     def on_created(self, event):  # type: ignore[override]
         if event.is_directory or not event.src_path.endswith(".md"):
             return
 
         print(f"New plan detected: {event.src_path}")
-        time.sleep(1)
-        plan_name = os.path.basename(event.src_path).replace(".md", "")
-        self.devbot.run_task(event.src_path, plan_name)
+        self.plans.put(("created", event.src_path))
+
+    def on_modified(self, event):  # type: ignore[override]
+        if event.is_directory or not event.src_path.endswith(".md"):
+            return
+
+        # Only restarts the settle delay of a plan that has not run yet.
+        self.plans.put(("modified", event.src_path))
+
+
+def run_plans(devbot: Agent, plans: "queue.Queue[Tuple[str, str]]") -> None:
+    """Run each new plan once it has gone SETTLE_SECONDS without a write."""
+    # Plans waiting to settle, mapped to the time of their last write.
+    pending: Dict[str, float] = {}
+    while True:
+        timeout = None
+        if pending:
+            timeout = max(0.0, min(pending.values()) + SETTLE_SECONDS - time.monotonic())
+        try:
+            kind, path = plans.get(timeout=timeout)
+            if kind == "created" or path in pending:
+                pending[path] = time.monotonic()
+        except queue.Empty:
+            pass
+
+        now = time.monotonic()
+        ready = [path for path, seen in pending.items() if now - seen >= SETTLE_SECONDS]
+        # Tasks share one working tree (branch checkouts), so they run one at a time.
+        for plan_path in ready:
+            del pending[plan_path]
+            plan_name = os.path.basename(plan_path).replace(".md", "")
+            try:
+                devbot.run_task(plan_path, plan_name)
+            except Exception as exc:  # pragma: no cover - keep the worker alive
+                print(f"Error running plan {plan_path}: {exc}")
 
 
 def start_watching() -> None:
     if not os.path.exists(config.AI_DOCS_DIR):
         os.makedirs(config.AI_DOCS_DIR)
 
+    plans: "queue.Queue[Tuple[str, str]]" = queue.Queue()
+    worker = threading.Thread(target=run_plans, args=(Agent(), plans), daemon=True)
+    worker.start()
+
     observer = Observer()
-    observer.schedule(PlanHandler(), path=config.AI_DOCS_DIR, recursive=False)
+    observer.schedule(PlanHandler(plans), path=config.AI_DOCS_DIR, recursive=False)
     observer.start()
     print(f"Watching {config.AI_DOCS_DIR} for plans...")
 
@@ -0,0 +1,6 @@
+import os
+
+# devbot.config validates these at import time; the tests never reach either API.
+os.environ.setdefault("ANTHROPIC_API_KEY", "test-key")
+os.environ.setdefault("GITHUB_TOKEN", "test-token")
+os.environ.setdefault("REPO_NAME", "owner/repo")
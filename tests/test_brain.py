@@ -0,0 +1,194 @@
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import pytest
+
+from devbot.brain import Agent, command_name
+from devbot.interfaces import IFileSystem, IGitOps
+
+
+class FakeFileSystem(IFileSystem):
+    def read_file(self, path: str) -> str:
+        return f"contents of {path}"
+
+    def write_file(self, path: str, content: str) -> str:
+        return f"Successfully wrote to {path}"
+
+    def list_files(self, path: str) -> str:
+        return path
+
+
+class FakeGit(IGitOps):
+    def create_branch(self, branch_name: str) -> None:
+        pass
+
+    def checkout_branch(self, branch_name: str) -> None:
+        pass
+
+    def commit_changes(self, message: str) -> None:
+        pass
+
+    def stash_changes(self, message: str) -> None:
+        pass
+
+    def push_changes(self, branch_name: str) -> None:
+        pass
+
+    def create_pr(self, branch_name: str, title: str, body: str) -> str:
+        return ""
+
+    def changed_files(self, base: str = "main") -> Dict[str, List[str]]:
+        return {"created": [], "modified": [], "deleted": []}
+
+
+class FakeStream:
+    """Stands in for MessageStream, recording how many chunks were consumed."""
+
+    def __init__(self, chunks: List[str]) -> None:
+        self.chunks = chunks
+        self.consumed = 0
+
+    def __enter__(self) -> "FakeStream":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        pass
+
+    @property
+    def text_stream(self) -> Iterator[str]:
+        for chunk in self.chunks:
+            self.consumed += 1
+            yield chunk
+
+
+class FakeMessages:
+    def __init__(self, stream: FakeStream) -> None:
+        self._stream = stream
+
+    def stream(self, **kwargs: Any) -> FakeStream:
+        return self._stream
+
+
+class FakeClient:
+    def __init__(self, stream: FakeStream) -> None:
+        self.messages = FakeMessages(stream)
+
+
+@pytest.fixture
+def agent() -> Agent:
+    return Agent(fs=FakeFileSystem(), git=FakeGit())
+
+
+def stream_reply(agent: Agent, chunks: List[str]) -> Tuple[str, int]:
+    stream = FakeStream(chunks)
+    agent.client = FakeClient(stream)  # type: ignore[assignment]
+    return agent._stream_reply("system", []), stream.consumed
+
+
+@pytest.mark.parametrize(
+    "line, expected",
+    [
+        ("READ_FILE a.py", "READ_FILE"),
+        ("  LIST_FILES", "LIST_FILES"),
+        ("DONE Add feature", "DONE"),
+        ("READ_FILEZ a.py", None),
+        ("DONEZO", None),
+        ("Now I will READ_FILE a.py", None),
+    ],
+)
+def test_command_name(line: str, expected: Optional[str]) -> None:
+    assert command_name(line) == expected
+
+
+def test_parse_batched_commands(agent: Agent) -> None:
+    reply = "READ_FILE a.py\nLIST_FILES src\nWRITE_FILE b.py\n<<<<\nprint('b')\n>>>>\n"
+    assert agent._parse_commands(reply) == [
+        ("READ_FILE", "a.py", None),
+        ("LIST_FILES", "src", None),
+        ("WRITE_FILE", "b.py", "print('b')"),
+    ]
+
+
+def test_parse_stops_at_first_non_command(agent: Agent) -> None:
+    reply = "READ_FILE a.py\nThen I will look at this:\nREAD_FILE b.py"
+    assert agent._parse_commands(reply) == [("READ_FILE", "a.py", None)]
+
+
+def test_parse_prose_first_reply_has_no_commands(agent: Agent) -> None:
+    assert agent._parse_commands("Let me start.\nREAD_FILE a.py") == []
+
+
+def test_parse_rejects_unknown_command_word(agent: Agent) -> None:
+    assert agent._parse_commands("READ_FILEZ a.py") == []
+
+
+def test_parse_done_after_prose(agent: Agent) -> None:
+    reply = "All changes are in place.\nDONE Add feature\n<<<<\nDetails\n>>>>"
+    assert agent._parse_commands(reply) == [("DONE", "Add feature", "Details")]
+
+
+def test_parse_done_after_leading_commands(agent: Agent) -> None:
+    reply = "WRITE_FILE a.py\n<<<<\nx = 1\n>>>>\nThat is everything.\nDONE Title"
+    assert agent._parse_commands(reply) == [
+        ("WRITE_FILE", "a.py", "x = 1"),
+        ("DONE", "Title", None),
+    ]
+
+
+def test_parse_ignores_done_inside_written_content(agent: Agent) -> None:
+    reply = "WRITE_FILE notes.md\n<<<<\nDONE is not a command here\n>>>>"
+    assert agent._parse_commands(reply) == [
+        ("WRITE_FILE", "notes.md", "DONE is not a command here"),
+    ]
+
+
+def test_parse_keeps_inline_block_terminator_in_content(agent: Agent) -> None:
+    reply = "WRITE_FILE shift.py\n<<<<\nx = y >>>> 2\n>>>>\nREAD_FILE a.py"
+    assert agent._parse_commands(reply) == [
+        ("WRITE_FILE", "shift.py", "x = y >>>> 2"),
+        ("READ_FILE", "a.py", None),
+    ]
+
+
+def test_parse_write_without_block(agent: Agent) -> None:
+    assert agent._parse_commands("WRITE_FILE a.py") == [("WRITE_FILE", "a.py", None)]
+
+
+def test_stream_stops_after_lookups_followed_by_prose(agent: Agent) -> None:
+    chunks = ["READ_FILE a.py\n", "READ_FILE b.py\n", "I will now", " explain", " at length"]
+    reply, consumed = stream_reply(agent, chunks)
+    assert consumed == 3
+    assert agent._parse_commands(reply) == [
+        ("READ_FILE", "a.py", None),
+        ("READ_FILE", "b.py", None),
+    ]
+
+
+def test_stream_stops_on_partial_line_that_cannot_be_a_command(agent: Agent) -> None:
+    reply, consumed = stream_reply(agent, ["READ_FILE a.py\nNow I", " read", " more"])
+    assert consumed == 1
+    assert reply == "READ_FILE a.py\nNow I"
+
+
+def test_stream_treats_unknown_command_word_as_prose(agent: Agent) -> None:
+    reply, consumed = stream_reply(agent, ["READ_FILE a.py\n", "READ_FILEZ b", " c", " d"])
+    assert consumed == 2
+
+
+def test_stream_waits_for_partial_command_name(agent: Agent) -> None:
+    chunks = ["READ_FILE a.py\nREAD_", "FILE b.py\n", "Done reading.", " Tail"]
+    reply, consumed = stream_reply(agent, chunks)
+    assert consumed == 3
+    assert [c[1] for c in agent._parse_commands(reply)] == ["a.py", "b.py"]
+
+
+def test_stream_reads_write_block_to_the_end(agent: Agent) -> None:
+    chunks = ["READ_FILE a.py\n", "WRITE_FILE b.py\n", "<<<<\nbody\n", ">>>>\n", "trailing"]
+    reply, consumed = stream_reply(agent, chunks)
+    assert consumed == len(chunks)
+    assert agent._parse_commands(reply)[-1] == ("WRITE_FILE", "b.py", "body")
+
+
+def test_stream_does_not_stop_without_a_lookup(agent: Agent) -> None:
+    chunks = ["Let me think", " about this.\n", "READ_FILE a.py\n"]
+    reply, consumed = stream_reply(agent, chunks)
+    assert consumed == len(chunks)